@@ -1,6 +1,10 @@
-from supabase import Client, create_client
+import asyncio
+import logging
+import re
+import time
+import httpx
 from pydantic import ValidationError
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
 from decimal import Decimal, ROUND_HALF_UP
 
 from receipty.models.receipt_models import (
@@ -9,34 +13,120 @@ from receipty.models.receipt_models import (
     Categories,
 )
 from receipty.config import settings
+from .llm_cache import get_cached_response, store_response
+from .llm_controller import AIMDController
+from .supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+# Shared HTTP/2 connection pool so concurrent LLM calls reuse TLS connections
+# instead of opening a new one per request. Closed on API shutdown.
+openai_http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    timeout=60,
+)
+
+client = AsyncOpenAI(api_key=settings.openai_api_key, http_client=openai_http_client)
+
+llm_controller = AIMDController(
+    max_concurrency=settings.llm_max_concurrency,
+    target_latency=settings.llm_target_latency,
+)
 
-supabase: Client = create_client(settings.supabase_url, settings.supabase_api_key)
+_LLM_MODEL = "gpt-4o-mini"
 
-client = AsyncOpenAI(api_key=settings.openai_api_key)
+# Maximum number of pending receipts claimed per processing batch
+_CLAIM_BATCH_SIZE = 100
+
+# Precision used to store item unit prices
+_UNIT_PRICE_QUANTUM = Decimal("0.0001")
+
+# Texts shorter than this, or without any digit (hence no price), cannot be receipts
+_MIN_RECEIPT_TEXT_LENGTH = 50
+_HAS_DIGIT = re.compile(r"\d")
+
+
+class LLMUnavailableError(Exception):
+    """
+    Raised when the LLM provider cannot be reached or is overloaded (circuit
+    breaker open, rate limit, server or connection error). The failure is
+    transient: the receipt is put back in the queue instead of being failed.
+    """
 
 
 # Private Helper Functions
 
 
-def _create_llm_prompt(receipt_text: str) -> str:
+# JSON Schema keywords rejected by OpenAI Structured Outputs in strict mode
+_STRICT_UNSUPPORTED_KEYWORDS = {"default", "minLength"}
+
+
+def _to_strict_json_schema(schema: dict, defs: dict | None = None) -> dict:
     """
-    Creates a prompt for the OpenAI LLM to extract structured data from the given receipt text.
-    The prompt provides critical rules for the LLM to follow when extracting information from the receipt text.
+    Converts a Pydantic JSON schema into one accepted by OpenAI Structured Outputs
+    in strict mode: every object forbids additional properties and lists all of its
+    properties as required, unsupported keywords are dropped, and '$ref' entries
+    carrying sibling keywords are inlined.
 
     Parameters
     ----------
-    receipt_text : str
-        The text content of the receipt to be analyzed.
+    schema : dict
+        The (sub-)schema to convert.
+    defs : dict | None
+        The '$defs' of the root schema, used to resolve references.
 
     Returns
     -------
-    str
-        A formatted prompt string for the OpenAI LLM to extract structured data from the receipt text.
+    dict
+        A new schema compatible with strict mode.
     """
 
-    category_list = ", ".join([c.value for c in Categories])
+    if defs is None:
+        defs = schema.get("$defs", {})
+
+    strict = {}
+    for key, value in schema.items():
+        if key in _STRICT_UNSUPPORTED_KEYWORDS:
+            continue
+        if key in ("properties", "$defs"):
+            strict[key] = {
+                name: _to_strict_json_schema(sub, defs) for name, sub in value.items()
+            }
+        elif key == "items":
+            strict[key] = _to_strict_json_schema(value, defs)
+        elif key == "anyOf":
+            strict[key] = [_to_strict_json_schema(sub, defs) for sub in value]
+        else:
+            strict[key] = value
+
+    if "$ref" in strict and len(strict) > 1:
+        ref_name = strict.pop("$ref").split("/")[-1]
+        strict = {**_to_strict_json_schema(defs[ref_name], defs), **strict}
+
+    if strict.get("type") == "object":
+        strict["additionalProperties"] = False
+        strict["required"] = list(strict.get("properties", {}))
 
-    return f"""
+    return strict
+
+
+# Response format sent with every LLM call, built once at import
+# (Pydantic schema generation is expensive).
+_RECEIPT_SCHEMA = _to_strict_json_schema(StructuredReceiptData.model_json_schema())
+_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "structured_receipt",
+        "schema": _RECEIPT_SCHEMA,
+        "strict": True,
+    },
+}
+
+
+# Prompt template, built once at import: only the receipt text varies per call.
+_CATEGORY_LIST = ", ".join(c.value for c in Categories)
+_PROMPT_PREFIX = f"""
     You are an expert financial assistant for French receipts.
     Your task is to extract information into a perfect JSON.
 
@@ -47,7 +137,7 @@ def _create_llm_prompt(receipt_text: str) -> str:
         - Get 'name' (correct OCR errors, e.g., 'Jarnbon' -> 'Jambon').
         - Get 'quantity' (must be 1 or more).
         - Get 'line_price' (this MUST be the TOTAL PRICE for the line).
-    4.  **CATEGORIES:** Assign a 'category' from this list: [{category_list}].
+    4.  **CATEGORIES:** Assign a 'category' from this list: [{_CATEGORY_LIST}].
         - - Use your common sense and critical thinking to classify items. for example, Anything related to transport (e.g., fuel, train tickets, public transport) should be categorized as 'Transport'.
         - Do NOT default to 'Autre' unless an item is truly unclassifiable.
     5. If two items have the same or similar name but different prices, DO NOT merge them — treat them as separate items.
@@ -56,11 +146,31 @@ def _create_llm_prompt(receipt_text: str) -> str:
 
     Receipt Text:
     ---
-    {receipt_text}
+    """
+_PROMPT_SUFFIX = """
     ---
     """
 
 
+def _create_llm_prompt(receipt_text: str) -> str:
+    """
+    Creates a prompt for the OpenAI LLM to extract structured data from the given receipt text.
+    The prompt provides critical rules for the LLM to follow when extracting information from the receipt text.
+
+    Parameters
+    ----------
+    receipt_text : str
+        The text content of the receipt to be analyzed.
+
+    Returns
+    -------
+    str
+        A formatted prompt string for the OpenAI LLM to extract structured data from the receipt text.
+    """
+
+    return _PROMPT_PREFIX + receipt_text + _PROMPT_SUFFIX
+
+
 async def _call_llm_api(prompt: str) -> str | None:
     """
     Calls the OpenAI LLM with the given prompt to extract structured data from a receipt.
@@ -73,50 +183,76 @@ async def _call_llm_api(prompt: str) -> str | None:
     Returns
     -------
     str | None
-        A JSON string containing the structured data extracted by the LLM, or None if an error occurred.
+        A JSON string containing the structured data extracted by the LLM, or None if
+        the response was unusable (refusal, malformed output, unexpected error).
+
+    Raises
+    ------
+    LLMUnavailableError
+        If the circuit breaker is open or the provider is rate-limiting, failing
+        or unreachable, so the call should be retried later.
     """
 
-    tool_name = "save_structured_receipt"
-    model_to_use = "gpt-4o-mini"
+    if llm_controller.is_open():
+        raise LLMUnavailableError("OpenAI circuit breaker is open.")
 
     try:
-        response = await client.chat.completions.create(
-            model=model_to_use,
-            messages=[{"role": "user", "content": prompt}],
-            tools=[
-                {
-                    "type": "function",
-                    "function": {
-                        "name": tool_name,
-                        "description": "Saves the extracted receipt data.",
-                        # Pass the Pydantic schema directly to OpenAI
-                        "parameters": StructuredReceiptData.model_json_schema(),
-                    },
-                }
-            ],
-            # Force the model to use our tool define with Pydantic
-            tool_choice={"type": "function", "function": {"name": tool_name}},
-        )
-
-        # Extract the JSON string from the tool call arguments
-        tool_call = response.choices[0].message.tool_calls[0]
-        if tool_call.function.name == tool_name:
-            raw_json_output = tool_call.function.arguments
-            print(
-                f"Successfully received structured data from OpenAI | model : {model_to_use}."
+        async with llm_controller:
+            start_time = time.monotonic()
+            raw_http_response = await client.chat.completions.with_raw_response.create(
+                model=_LLM_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                # Structured Outputs: the response is guaranteed to match the schema
+                response_format=_RESPONSE_FORMAT,
+                stream=True,
             )
-
-            # --- AJOUT POUR LE DÉBOGAGE ---
-            print("--- Raw JSON Response from LLM ---")
-            print(raw_json_output)
-            print("----------------------------------")
-            return raw_json_output
-        else:
-            print(f"Error: LLM called unexpected tool: {tool_call.function.name}")
+            stream = raw_http_response.parse()
+
+            # Accumulate the streamed JSON, aborting early on a malformed prefix
+            content_parts = []
+            refusal_parts = []
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.refusal:
+                    refusal_parts.append(delta.refusal)
+                if delta.content:
+                    prefix = delta.content.lstrip()
+                    if not content_parts and prefix and not prefix.startswith("{"):
+                        await stream.close()
+                        logger.error("LLM response does not start with a JSON object.")
+                        return None
+                    content_parts.append(delta.content)
+            latency = time.monotonic() - start_time
+
+        # Feed latency and rate-limit headers back into the AIMD controller
+        llm_controller.record_success(latency, raw_http_response.headers)
+
+        if refusal_parts:
+            refusal = "".join(refusal_parts)
+            logger.error("LLM refused to extract the receipt: %s", refusal)
             return None
 
+        raw_json_output = "".join(content_parts)
+        logger.info(
+            "Successfully received structured data from OpenAI | model : %s.",
+            _LLM_MODEL,
+        )
+        logger.debug("Raw JSON response from LLM: %s", raw_json_output)
+        return raw_json_output
+
+    except (RateLimitError, InternalServerError) as e:
+        # Back off: halve concurrency and honour 'retry-after'
+        llm_controller.record_failure(e.response.headers)
+        raise LLMUnavailableError(
+            f"OpenAI API overloaded (HTTP {e.status_code}), backing off: {e}"
+        ) from e
+    except APIConnectionError as e:
+        llm_controller.record_failure()
+        raise LLMUnavailableError(f"Error connecting to OpenAI API: {e}") from e
     except Exception as e:
-        print(f"Error calling OpenAI API: {e}")
+        logger.error("Error calling OpenAI API: %s", e)
         return None
 
 
@@ -137,32 +273,61 @@ def _parse_and_validate_response(raw_response: str) -> StructuredReceiptData | N
     """
 
     try:
-        # The response from tool calling is already a JSON string
+        # The structured output is already a JSON string
         structured_data = StructuredReceiptData.model_validate_json(raw_response)
 
-        print("LLM response successfully parsed and validated.")
+        logger.info("LLM response successfully parsed and validated.")
         return structured_data
     except ValidationError as e:
-        print(f"Error: LLM response did not match Pydantic schema. {e}")
-        # --- AJOUT POUR LE DÉBOGAGE ---
-        print("--- Raw Response from LLM was ---")
-        print(raw_response)
-        print("----------------------------------")
+        logger.error("LLM response did not match Pydantic schema. %s", e)
+        logger.debug("Raw response from LLM was: %s", raw_response)
         return None
 
 
-async def _update_database(receipt_id: str, data: StructuredReceiptData) -> bool:
+async def _set_claimed_status(receipt_id: str, claim_id: str, status: Status) -> None:
+    """
+    Sets the status of a receipt only while it is still 'processing' under the
+    given claim, so a worker whose claim was taken over cannot overwrite the
+    outcome written by the new owner.
+
+    Parameters
+    ----------
+    receipt_id : str
+        The ID of the receipt to update.
+    claim_id : str
+        The claim token returned by 'claim_pending_receipts'.
+    status : Status
+        The new status of the receipt.
+    """
+
+    await (
+        supabase.table("receipts")
+        .update({"status": status})
+        .eq("id", receipt_id)
+        .eq("status", Status.PROCESSING)
+        .eq("claim_id", claim_id)
+        .execute()
+    )
+
+
+async def _update_database(
+    receipt_id: str, claim_id: str, data: StructuredReceiptData
+) -> bool:
     """
     Updates the database with the extracted structured data from the LLM.
 
-    1. Updates the 'receipts' table with the extracted general info.
+    1. Prepares the extracted general info of the receipt.
     2. Prepares the list of items for batch insertion.
-    3. Inserts all items into the 'items' table.
+    3. Saves both through the 'finalize_receipt' Postgres function, which updates
+       the 'receipts' row and inserts the items in one transaction and one round-trip,
+       and does nothing if the receipt is no longer held by this claim.
 
     Parameters
     ----------
     receipt_id : str
         The ID of the receipt to be updated.
+    claim_id : str
+        The claim token returned by 'claim_pending_receipts'.
     data : StructuredReceiptData
         The extracted structured data from the LLM.
 
@@ -173,117 +338,239 @@ async def _update_database(receipt_id: str, data: StructuredReceiptData) -> bool
     """
 
     try:
-        # 1. Update the 'receipts' table with the extracted general info
-        update_data = {
+        # 1. Prepare the extracted general info
+        receipt_meta = {
             "merchant": data.merchant,
             "receipt_date": data.receipt_date.isoformat(),
             "total_amount": float(data.total_amount),
             "status": Status.PROCESSED,
         }
-        supabase.table("receipts").update(update_data).eq("id", receipt_id).execute()
 
         # 2. Prepare the list of items for batch insertion
-        items_to_insert = []
-        for item in data.items:
-            # Python calculates the unit price reliably.
-            unit_price = item.line_price / item.quantity
-            items_to_insert.append(
-                {
-                    "receipt_id": receipt_id,
-                    "name": item.name,
-                    "quantity": item.quantity,
-                    "price": float(
-                        unit_price.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-                    ),
-                    "category": item.category.value,
-                }
+        # Python calculates the unit price reliably.
+        items_to_insert = [
+            {
+                "name": item.name,
+                "quantity": item.quantity,
+                "price": float(
+                    (item.line_price / item.quantity).quantize(
+                        _UNIT_PRICE_QUANTUM, rounding=ROUND_HALF_UP
+                    )
+                ),
+                "category": item.category.value,
+            }
+            for item in data.items
+        ]
+
+        # 3. Update the receipt and insert its items in a single transaction
+        response = await supabase.rpc(
+            "finalize_receipt",
+            {
+                "p_receipt_id": receipt_id,
+                "p_claim_id": claim_id,
+                "p_meta": receipt_meta,
+                "p_items": items_to_insert,
+            },
+        ).execute()
+        if not response.data:
+            logger.warning(
+                "Receipt %s was reclaimed by another run, result discarded.",
+                receipt_id,
             )
+            return False
 
-        # 3. Insert all items into the 'items' table
-        if items_to_insert:
-            supabase.table("items").insert(items_to_insert).execute()
-
-        print(f"Successfully processed and saved data for receipt ID: {receipt_id}")
+        logger.info(
+            "Successfully processed and saved data for receipt ID: %s", receipt_id
+        )
         return True
 
     except Exception as e:
-        print(f"Database error while updating receipt {receipt_id}: {e}")
+        logger.error("Database error while updating receipt %s: %s", receipt_id, e)
         # Rollback status to 'failed'
-        supabase.table("receipts").update({"status": Status.FAILED}).eq(
-            "id", receipt_id
-        ).execute()
+        await _set_claimed_status(receipt_id, claim_id, Status.FAILED)
         return False
 
 
-# Public Main Function
+async def _process_receipt(receipt: dict, semaphore: asyncio.Semaphore) -> bool:
+    """
+    Runs the full LLM pipeline (cache lookup, prompt, LLM call, validation,
+    database update) for a single pending receipt.
 
+    Parameters
+    ----------
+    receipt : dict
+        A claimed row from the 'receipts' table containing 'id', 'extracted_text'
+        and 'claim_id'.
+    semaphore : asyncio.Semaphore
+        Shared semaphore bounding the number of receipts processed concurrently.
 
-async def process_pending_receipts():
+    Returns
+    -------
+    bool
+        True if the receipt was successfully processed and saved, False otherwise.
     """
-    Process all pending receipts in the database by calling the LLM to extract structured data.
 
-    This function fetches all pending receipts from the database, creates a prompt for the LLM,
-    calls the LLM to extract structured data, validates the response against a Pydantic schema,
-    and updates the database with the extracted data.
+    receipt_id = receipt["id"]
+    claim_id = receipt["claim_id"]
+    text = receipt["extracted_text"]
+
+    async with semaphore:
+        logger.info("Processing receipt ID: %s...", receipt_id)
+
+        try:
+            # 0. Skip texts that cannot yield a valid receipt before any LLM call
+            if not text or len(text.strip()) < _MIN_RECEIPT_TEXT_LENGTH:
+                raise ValueError("text_too_short: receipt text is empty or too short.")
+            if not _HAS_DIGIT.search(text):
+                raise ValueError("no_digits: receipt text contains no price.")
+
+            # 1. Reuse a cached response for identical receipt text
+            raw_response = await get_cached_response(text)
+            is_cached = raw_response is not None
+            if is_cached:
+                logger.info("Using cached LLM response for receipt %s.", receipt_id)
+            else:
+                # 2. Create Prompt and call LLM
+                prompt = _create_llm_prompt(text)
+                raw_response = await _call_llm_api(prompt)
+                if not raw_response:
+                    raise ValueError("LLM API call failed or returned empty response.")
+
+            # 3. Validate Response
+            structured_data = _parse_and_validate_response(raw_response)
+            if not structured_data:
+                raise ValueError("LLM response failed Pydantic validation.")
+            if not is_cached:
+                await store_response(text, raw_response)
+
+            # 4. Update Database
+            return await _update_database(receipt_id, claim_id, structured_data)
+
+        except LLMUnavailableError as e:
+            logger.warning(
+                "LLM unavailable, returning receipt %s to the queue: %s",
+                receipt_id,
+                e,
+            )
+            # Transient outage: put it back to 'pending' so a later run retries it
+            await _set_claimed_status(receipt_id, claim_id, Status.PENDING)
+            return False
+
+        except Exception as e:
+            logger.error("Failed to process receipt %s: %s", receipt_id, e)
+            # Mark as 'failed' if any step in the try block fails
+            await _set_claimed_status(receipt_id, claim_id, Status.FAILED)
+            return False
+
+
+async def _release_claimed_receipts(receipt_ids: list, claim_id: str) -> None:
     """
+    Puts receipts of an interrupted batch that are still 'processing' under its
+    claim back to 'pending', so they are picked up by the next run instead of
+    waiting for the stale-claim timeout of 'claim_pending_receipts'.
 
-    print("\nStarting LLM processing batch...")
+    Parameters
+    ----------
+    receipt_ids : list
+        The IDs of the receipts claimed by the interrupted batch.
+    claim_id : str
+        The claim token shared by the receipts of the batch.
+    """
 
     try:
-        response = (
+        await (
             supabase.table("receipts")
-            .select("id, extracted_text")
-            .eq("status", Status.PENDING.value)
+            .update({"status": Status.PENDING})
+            .in_("id", receipt_ids)
+            .eq("status", Status.PROCESSING)
+            .eq("claim_id", claim_id)
             .execute()
         )
-        pending_receipts = response.data
+        logger.info("Returned unfinished receipts of the batch to the queue.")
     except Exception as e:
-        print(f"Error fetching pending receipts: {e}")
-        return
+        logger.error("Could not return claimed receipts to the queue: %s", e)
 
-    if not pending_receipts:
-        print(f"No pending receipts found : {pending_receipts}")
-        return
 
-    print(f"Found {len(pending_receipts)} receipts to process.")
-    processed_count = 0
+# Public Main Function
 
-    for receipt in pending_receipts:
-        receipt_id = receipt["id"]
-        text = receipt["extracted_text"]
 
-        print(f"\nProcessing receipt ID: {receipt_id}...")
+async def process_pending_receipts() -> int:
+    """
+    Process all pending receipts in the database by calling the LLM to extract structured data.
 
-        try:
-            supabase.table("receipts").update({"status": Status.PROCESSING}).eq(
-                "id", receipt_id
-            ).execute()
+    Receipts are claimed from the database in size-bounded batches, oldest first
+    (each claim marks them as 'processing' in the same statement), so memory stays
+    bounded and results are saved batch by batch. If the run is cancelled, the
+    unfinished receipts of the current batch are put back to 'pending'; claims
+    lost to a crash are taken over by a later claim after a timeout, and every
+    write is guarded by the batch's claim token so a taken-over batch cannot
+    write twice. For each receipt, this function creates a prompt for the LLM,
+    calls the LLM to extract structured data, validates the response against a
+    Pydantic schema, and updates the database with the extracted data. No new
+    batch is claimed while the LLM circuit breaker is open.
 
-            # 1. Create Prompt
-            prompt = _create_llm_prompt(text)
+    Returns
+    -------
+    int
+        The total number of receipts claimed (0 if none were pending).
+    """
 
-            # 2. Call LLM
-            raw_response = await _call_llm_api(prompt)
-            if not raw_response:
-                raise ValueError("LLM API call failed or returned empty response.")
+    logger.info("Starting LLM processing batch...")
 
-            # 3. Validate Response
-            structured_data = _parse_and_validate_response(raw_response)
-            if not structured_data:
-                raise ValueError("LLM response failed Pydantic validation.")
+    # Receipts are independent and the work is I/O-bound, so process them
+    # concurrently while bounding the number of in-flight LLM calls.
+    semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+    claimed_count = 0
+    processed_count = 0
 
-            # 4. Update Database
-            success = await _update_database(receipt_id, structured_data)
-            if success:
-                processed_count += 1
+    while True:
+        # Don't claim receipts the open breaker would only hand back to the queue;
+        # they stay 'pending' for the next run
+        if llm_controller.is_open():
+            logger.warning("OpenAI circuit breaker is open, not claiming receipts.")
+            break
 
-        except Exception as e:
-            print(f"Failed to process receipt {receipt_id}: {e}")
-            # Mark as 'failed' if any step in the try block fails
-            supabase.table("receipts").update({"status": Status.FAILED}).eq(
-                "id", receipt_id
+        try:
+            # Claim pending receipts and mark them 'processing' in a single statement
+            response = await supabase.rpc(
+                "claim_pending_receipts", {"p_limit": _CLAIM_BATCH_SIZE}
             ).execute()
+            pending_receipts = response.data
+        except Exception as e:
+            logger.error("Error fetching pending receipts: %s", e)
+            break
+
+        if not pending_receipts:
+            break
+
+        logger.info("Found %d receipts to process.", len(pending_receipts))
 
-    print(
-        f"LLM processing batch finished. Successfully processed {processed_count}/{len(pending_receipts)} receipts."
+        try:
+            results = await asyncio.gather(
+                *[_process_receipt(receipt, semaphore) for receipt in pending_receipts],
+                return_exceptions=True,
+            )
+        except asyncio.CancelledError:
+            # Shutdown (Ctrl-C, API stop): don't leave the batch stranded
+            await _release_claimed_receipts(
+                [receipt["id"] for receipt in pending_receipts],
+                pending_receipts[0]["claim_id"],
+            )
+            raise
+        claimed_count += len(pending_receipts)
+        processed_count += sum(1 for result in results if result is True)
+
+        # A partial batch means the queue has been drained
+        if len(pending_receipts) < _CLAIM_BATCH_SIZE:
+            break
+
+    if claimed_count == 0:
+        logger.info("No pending receipts found.")
+        return 0
+
+    logger.info(
+        "LLM processing batch finished. Successfully processed %d/%d receipts.",
+        processed_count,
+        claimed_count,
     )
+    return claimed_count
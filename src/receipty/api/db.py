@@ -1,13 +1,9 @@
-from supabase import Client, create_client
-
-from receipty.config import settings
-
-supabase: Client = create_client(settings.supabase_url, settings.supabase_api_key)
+from .supabase_client import supabase
 
 
 async def get_receipts():
     try:
-        response = supabase.table("receipts").select("*").execute()
+        response = await supabase.table("receipts").select("*").execute()
         return response.data
     except Exception as e:
         raise Exception(f"❌ Error during Supabase call: {e}")
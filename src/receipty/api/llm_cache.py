@@ -0,0 +1,95 @@
+import hashlib
+import logging
+from collections import OrderedDict
+
+from .supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+# In-process LRU in front of the persistent 'llm_cache' table
+_MAX_CACHED_RESPONSES = 1024
+_memory_cache: OrderedDict[str, str] = OrderedDict()
+
+
+# Private Helper Functions
+
+
+def _hash_text(receipt_text: str) -> str:
+    return hashlib.blake2b(receipt_text.encode(), digest_size=16).hexdigest()
+
+
+def _remember(text_hash: str, raw_response: str) -> None:
+    _memory_cache[text_hash] = raw_response
+    _memory_cache.move_to_end(text_hash)
+    if len(_memory_cache) > _MAX_CACHED_RESPONSES:
+        _memory_cache.popitem(last=False)
+
+
+# Public Functions
+
+
+async def get_cached_response(receipt_text: str) -> str | None:
+    """
+    Looks up a previously validated LLM response for the given receipt text,
+    first in memory, then in the 'llm_cache' table.
+
+    Parameters
+    ----------
+    receipt_text : str
+        The raw text of the receipt.
+
+    Returns
+    -------
+    str | None
+        The cached raw JSON response, or None on a cache miss or lookup error.
+    """
+
+    text_hash = _hash_text(receipt_text)
+
+    cached = _memory_cache.get(text_hash)
+    if cached is not None:
+        _memory_cache.move_to_end(text_hash)
+        return cached
+
+    try:
+        response = (
+            await supabase.table("llm_cache")
+            .select("response")
+            .eq("text_hash", text_hash)
+            .limit(1)
+            .execute()
+        )
+    except Exception as e:
+        logger.warning("LLM cache lookup failed: %s", e)
+        return None
+
+    if not response.data:
+        return None
+
+    raw_response = response.data[0]["response"]
+    _remember(text_hash, raw_response)
+    return raw_response
+
+
+async def store_response(receipt_text: str, raw_response: str) -> None:
+    """
+    Caches a validated LLM response for the given receipt text, in memory and
+    in the 'llm_cache' table. Persistence errors are logged, never raised.
+
+    Parameters
+    ----------
+    receipt_text : str
+        The raw text of the receipt.
+    raw_response : str
+        The validated raw JSON response returned by the LLM.
+    """
+
+    text_hash = _hash_text(receipt_text)
+    _remember(text_hash, raw_response)
+
+    try:
+        await supabase.table("llm_cache").upsert(
+            {"text_hash": text_hash, "response": raw_response}
+        ).execute()
+    except Exception as e:
+        logger.warning("Failed to persist LLM response to cache: %s", e)
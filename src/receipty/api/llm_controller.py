@@ -0,0 +1,195 @@
+import asyncio
+import re
+import time
+from email.utils import parsedate_to_datetime
+
+from httpx import Headers
+
+# Private Helper Functions
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str | None) -> float | None:
+    """
+    Parses an OpenAI rate-limit duration (e.g. '1s', '6m0s', '120ms') into seconds.
+
+    Parameters
+    ----------
+    value : str | None
+        The raw header value.
+
+    Returns
+    -------
+    float | None
+        The duration in seconds, or None if the value could not be parsed.
+    """
+
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _parse_retry_after(headers: Headers | None) -> float | None:
+    """
+    Extracts the delay requested by the server from 'retry-after-ms' or 'retry-after'.
+
+    Parameters
+    ----------
+    headers : Headers | None
+        The response headers, if a response was received.
+
+    Returns
+    -------
+    float | None
+        The delay in seconds, or None if the server did not request one.
+    """
+
+    if headers is None:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Public Controller
+
+
+class AIMDController:
+    """
+    Adaptive concurrency limiter and circuit breaker for calls to the LLM provider.
+
+    The concurrency limit follows a TCP-style AIMD rule: it grows additively while
+    calls succeed under the target latency and is halved on rate-limit or server
+    errors. After too many consecutive failures the circuit opens and calls are
+    short-circuited until the recovery timeout has elapsed.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        target_latency: float,
+        min_concurrency: int = 1,
+        increase_step: float = 0.5,
+        decrease_factor: float = 0.5,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        default_backoff: float = 1.0,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(min_concurrency, max_concurrency)
+        self.target_latency = target_latency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.default_backoff = default_backoff
+
+        self.limit: float = float(self.max_concurrency)
+        self._avg_latency: float | None = None
+        self._in_flight = 0
+        self._slot_released = asyncio.Event()
+        self._paused_until = 0.0
+        self._consecutive_failures = 0
+        self._opened_at: float | None = None
+
+    def is_open(self) -> bool:
+        """Returns True while the circuit breaker is rejecting calls."""
+        if self._opened_at is None:
+            return False
+        if time.monotonic() - self._opened_at >= self.recovery_timeout:
+            # Half-open: let calls through, the next outcome decides.
+            return False
+        return True
+
+    async def __aenter__(self) -> "AIMDController":
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self._in_flight < int(self.limit):
+                self._in_flight += 1
+                return self
+            self._slot_released.clear()
+            await self._slot_released.wait()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._in_flight -= 1
+        self._slot_released.set()
+
+    def record_success(self, latency: float, headers: Headers | None = None) -> None:
+        """
+        Registers a successful call: closes the circuit, raises the limit additively
+        when latency is healthy, and pauses preemptively if the quota is exhausted.
+
+        Parameters
+        ----------
+        latency : float
+            Duration of the call in seconds.
+        headers : Headers | None
+            The response headers, used to read the 'x-ratelimit-*' quota.
+        """
+
+        self._consecutive_failures = 0
+        self._opened_at = None
+
+        self._avg_latency = (
+            latency
+            if self._avg_latency is None
+            else 0.8 * self._avg_latency + 0.2 * latency
+        )
+        if self._avg_latency <= self.target_latency:
+            self.limit = min(self.max_concurrency, self.limit + self.increase_step)
+
+        if headers is None:
+            return
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is not None and remaining.strip() == "0":
+                reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                self._pause(reset if reset is not None else self.default_backoff)
+
+    def record_failure(self, headers: Headers | None = None) -> None:
+        """
+        Registers a rate-limit or server error: halves the limit, pauses for the
+        'retry-after' delay and opens the circuit after repeated failures.
+
+        Parameters
+        ----------
+        headers : Headers | None
+            The error response headers, if a response was received.
+        """
+
+        self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+
+        retry_after = _parse_retry_after(headers)
+        self._pause(retry_after if retry_after is not None else self.default_backoff)
+
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+    def _pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
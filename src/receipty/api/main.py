@@ -1,3 +1,5 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, BackgroundTasks
 from typing import List
 
@@ -5,13 +7,33 @@ from .db import (
     get_receipts,
 )
 
+from receipty.config import get_settings
+from receipty.logging_config import configure_logging
 from receipty.models.receipt_models import ReceiptDB, MessageResponse
-from .LLM_processor import process_pending_receipts
+from .LLM_processor import openai_http_client, process_pending_receipts
+from .supabase_client import http_client as supabase_http_client
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the background log listener on startup. On shutdown, closes the
+    pooled HTTP clients and flushes the log listener.
+    """
+    log_listener = configure_logging(get_settings().log_level)
+    yield
+    await openai_http_client.aclose()
+    await supabase_http_client.aclose()
+    log_listener.stop()
+
 
 app = FastAPI(
     title="Receipty API",
     description="API for processing receipts and managing data analysis.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -25,7 +47,15 @@ def read_root():
     return {"message": "Receipty API is running."}
 
 
-@app.get("/receipts", tags=["Receipts"], response_model=List[ReceiptDB])
+@app.get(
+    "/receipts",
+    tags=["Receipts"],
+    # Rows come straight from our own database and are validated at write time
+    # (LLM output path), so skip per-row response validation. The model is
+    # still declared for the OpenAPI schema.
+    response_model=None,
+    responses={200: {"model": List[ReceiptDB]}},
+)
 async def get_all_receipts():
     """
     Retrieve all receipts currently stored in the database.
@@ -51,8 +81,15 @@ async def trigger_processing(background_tasks: BackgroundTasks):
     This endpoint returns immediately with a '202 Accepted' status
     to indicate that the task has been queued. The actual processing
     (fetching from DB, calling LLM, updating DB) happens in the background.
+
+    When the standalone worker is enabled (`LLM_WORKER_ENABLED`), pending
+    receipts are already queued durably in the database and picked up by the
+    worker process, so nothing runs inside the API process.
     """
-    print("API: Received request to process pending receipts.")
+    logger.info("API: Received request to process pending receipts.")
+
+    if get_settings().llm_worker_enabled:
+        return {"message": "Pending receipts will be processed by the worker."}
 
     background_tasks.add_task(process_pending_receipts)
 
@@ -0,0 +1,20 @@
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+from receipty.config import settings
+
+# Single async Supabase client shared by the whole API, backed by one pooled
+# HTTP client so connections are kept alive and reused across requests.
+# DB calls must be awaited so they never block the event loop.
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+    timeout=120,
+)
+
+# The constructor is used instead of `acreate_client` so the client can be
+# built at import time; with a service key there is no user session to restore.
+supabase: AsyncClient = AsyncClient(
+    settings.supabase_url,
+    settings.supabase_api_key,
+    options=AsyncClientOptions(httpx_client=http_client),
+)
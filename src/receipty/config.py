@@ -1,24 +1,44 @@
+import re
+from functools import lru_cache
+
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+_SUPABASE_URL_RE = re.compile(r"https://[A-Za-z0-9.-]+\.supabase\.co")
+
 
 class Settings(BaseSettings):
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", frozen=True
+    )
 
     supabase_url: str = Field(min_length=20, env="SUPABASE_URL")
     supabase_api_key: str = Field(min_length=1, env="SUPABASE_API_KEY")
     streamlit_guest_password: str = Field(..., env="STREAMLIT_GUEST_PASSWORD")
     streamlit_dev_password: str = Field(..., env="STREAMLIT_DEV_PASSWORD")
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
+    llm_max_concurrency: int = Field(default=8, ge=1, env="LLM_MAX_CONCURRENCY")
+    llm_target_latency: float = Field(default=15.0, gt=0, env="LLM_TARGET_LATENCY")
+    log_level: str = Field(default="INFO", env="LOG_LEVEL")
+    llm_worker_enabled: bool = Field(default=False, env="LLM_WORKER_ENABLED")
+    llm_worker_poll_interval: float = Field(
+        default=5.0, gt=0, env="LLM_WORKER_POLL_INTERVAL"
+    )
 
     @field_validator("supabase_url")
     @classmethod
     def check_supabase_url(cls, value: str) -> str:
-        if not value.startswith("https://"):
-            raise ValueError("Supabase URL must start with https://")
-        if not value.endswith(".supabase.co"):
-            raise ValueError("Supabase URL must end with .supabase.co")
+        if not _SUPABASE_URL_RE.fullmatch(value):
+            raise ValueError(
+                "Supabase URL must start with https:// and end with .supabase.co"
+            )
         return value
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Returns the application settings, reading '.env' and validating only once."""
+    return Settings()
+
+
+settings = get_settings()
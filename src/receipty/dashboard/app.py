@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from supabase import create_client, Client
 import plotly.express as px
 from datetime import date
@@ -80,37 +81,288 @@ def authenticate():
 
 
 # DATA LOADING AND CACHING
-@st.cache_data(ttl=600)
-def load_data():
+PAGE_SIZE = 1000  # Supabase's default maximum number of rows per request
+FAILED_RECEIPTS_LIMIT = 500
+RAW_ITEMS_LIMIT = 1000
+DATA_TTL = 600  # seconds
+
+
+def fetch_all_rows(build_query, order_by):
+    """
+    Runs a query page by page and returns every row, so results are never silently
+    truncated to the server's maximum page size. build_query returns a fresh query
+    for each page; order_by is a unique column keeping the pages stable.
+    """
+    rows = []
+    start = 0
+    while True:
+        page = (
+            build_query()
+            .order(order_by)
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+            .data
+        )
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+@st.cache_data(ttl=DATA_TTL)
+def load_filter_options():
+    """
+    Loads the date bounds, categories and merchants offered by the sidebar filters,
+    computed server-side by the 'dashboard_filter_options' Postgres function.
+    Returns None when there are no items yet.
+    """
+    options = supabase.rpc("dashboard_filter_options").execute().data[0]
+    if options["min_date"] is None:
+        return None
+
+    return {
+        "min_date": date.fromisoformat(options["min_date"]),
+        "max_date": date.fromisoformat(options["max_date"]),
+        "categories": options["categories"],
+        "merchants": options["merchants"],
+    }
+
+
+@st.cache_data(ttl=DATA_TTL)
+def load_filtered_kpi(
+    function_name, columns, start_date, end_date, categories, merchants
+):
+    """
+    Loads one filtered aggregate from a 'kpi_by_*' Postgres function, which takes
+    the sidebar filters as parameters, so only aggregated rows leave the database.
+    Cached per function and filter combination.
+    """
+    params = {
+        "p_start": start_date.isoformat(),
+        "p_end": end_date.isoformat(),
+        "p_categories": list(categories),
+        "p_merchants": list(merchants),
+    }
+    rows = fetch_all_rows(lambda: supabase.rpc(function_name, params), columns[0])
+    df = pd.DataFrame(rows, columns=list(columns))
+
+    for column in ("total_price", "average_receipt"):
+        if column in df:
+            df[column] = df[column].astype(float)
+    if "receipt_date" in df:
+        df["receipt_date"] = pd.to_datetime(df["receipt_date"])
+
+    return df
+
+
+@st.cache_data(ttl=DATA_TTL)
+def load_receipt_items(receipt_id, categories):
+    """
+    Loads the items of a single receipt, restricted to the selected categories,
+    only when it is picked in the detail view.
+    """
+    response = (
+        supabase.table("items")
+        .select("name, quantity, price, total_price, category")
+        .eq("receipt_id", receipt_id)
+        .in_("category", list(categories))
+        .order("id")
+        .execute()
+    )
+    return pd.DataFrame(
+        response.data, columns=["name", "quantity", "price", "total_price", "category"]
+    )
+
+
+@st.cache_data(ttl=DATA_TTL)
+def load_monthly_summary():
+    """
+    Loads the total spending per month, aggregated server-side by the
+    'kpi_monthly' Postgres function.
+    """
+    response = supabase.rpc("kpi_monthly").execute()
+    monthly_summary = pd.DataFrame(response.data, columns=["month", "total_price"])
+
+    monthly_summary["month_period"] = pd.to_datetime(
+        monthly_summary["month"]
+    ).dt.to_period("M")
+    monthly_summary["total_price"] = monthly_summary["total_price"].astype(float)
+    monthly_summary["Month"] = monthly_summary["month_period"].dt.strftime("%Y-%m")
+
+    return monthly_summary[["month_period", "Month", "total_price"]]
+
+
+@st.cache_data(ttl=60)
+def load_failed_receipts():
     """
-    Loads data from Supabase, merges receipts and items, and prepares it for analysis.
+    Loads the failed receipts directly from the 'receipts' table (one row per
+    receipt, only the displayed columns, at most FAILED_RECEIPTS_LIMIT rows),
+    along with the exact number of failed receipts. Cached briefly, as the queue
+    changes more often than the analysed data.
     """
-    receipts_response = (
+    response = (
         supabase.table("receipts")
-        .select("id, receipt_date, merchant, status")
+        .select("id, receipt_date, merchant, status", count="exact")
+        .eq("status", "failed")
+        .limit(FAILED_RECEIPTS_LIMIT)
         .execute()
     )
-    items_response = (
+    df_failed = pd.DataFrame(
+        response.data, columns=["id", "receipt_date", "merchant", "status"]
+    )
+    return df_failed, response.count
+
+
+@st.cache_data(ttl=60)
+def load_raw_items():
+    """
+    Loads a window of at most RAW_ITEMS_LIMIT rows of the 'items' table for the
+    raw data inspector, along with the exact number of items.
+    """
+    response = (
         supabase.table("items")
-        .select("receipt_id, name, price, quantity, category")
+        .select(
+            "receipt_id, name, price, quantity, category, total_price", count="exact"
+        )
+        .order("id")
+        .limit(RAW_ITEMS_LIMIT)
         .execute()
     )
+    df_items = pd.DataFrame(
+        response.data,
+        columns=["receipt_id", "name", "price", "quantity", "category", "total_price"],
+    )
+    return df_items, response.count
 
-    receipts_df = pd.DataFrame(receipts_response.data)
-    items_df = pd.DataFrame(items_response.data)
 
-    if receipts_df.empty or items_df.empty:
-        return pd.DataFrame()
+# CHART HELPERS
+DOWNSAMPLE_THRESHOLD = 2000
+MAX_CHART_POINTS = 1500
 
-    receipts_df["receipt_date"] = pd.to_datetime(receipts_df["receipt_date"])
 
-    df = pd.merge(
-        items_df, receipts_df, left_on="receipt_id", right_on="id", how="left"
-    )
+def downsample_lttb(df, x, y, n_out=MAX_CHART_POINTS):
+    """
+    Reduces a time series to at most n_out points with the Largest-Triangle-Three-
+    Buckets algorithm, which keeps the visual shape (peaks and troughs) of the line
+    while bounding what Plotly ships to the browser.
+    """
+    n = len(df)
+    if n <= DOWNSAMPLE_THRESHOLD or n_out >= n:
+        return df
+
+    xs = pd.to_datetime(df[x]).to_numpy().astype("int64").astype(float)
+    ys = df[y].to_numpy(dtype=float)
+
+    bucket_size = (n - 2) / (n_out - 2)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+
+        avg_x = xs[end:next_end].mean()
+        avg_y = ys[end:next_end].mean()
+        areas = np.abs(
+            (xs[previous] - avg_x) * (ys[start:end] - ys[previous])
+            - (xs[previous] - xs[start:end]) * (avg_y - ys[previous])
+        )
+        previous = start + int(areas.argmax())
+        selected[i + 1] = previous
 
-    df["total_price"] = df["price"] * df["quantity"]
+    return df.iloc[selected]
 
-    return df
+
+# FRAGMENTS
+@st.fragment
+def render_receipt_details(receipt_totals, selected_categories):
+    """
+    Renders the per-receipt item viewer. As a fragment, picking another receipt
+    only reruns this section instead of the whole dashboard; its items are fetched
+    on demand.
+    """
+    if not receipt_totals.empty:
+        receipt_summary = receipt_totals.sort_values(by="receipt_date", ascending=False)
+
+        dates = receipt_summary["receipt_date"].dt.strftime("%Y-%m-%d")
+        totals = receipt_summary["total_price"].map("{:.2f}€".format)
+        receipt_summary["display_label"] = (
+            dates
+            + " - "
+            + receipt_summary["merchant"].astype(str)
+            + " ("
+            + totals
+            + ")"
+        )
+
+        receipt_options = receipt_summary["display_label"].tolist()
+        # Built in reverse so that, for duplicate labels, the first receipt wins
+        label_to_id = dict(
+            zip(
+                reversed(receipt_options),
+                reversed(receipt_summary["receipt_id"].tolist()),
+            )
+        )
+        selected_receipt_label = st.selectbox(
+            "Select a specific receipt to view its items:", receipt_options
+        )
+
+        if selected_receipt_label:
+            selected_receipt_id = label_to_id[selected_receipt_label]
+
+            items_of_selected_receipt = load_receipt_items(
+                selected_receipt_id, tuple(selected_categories)
+            )
+
+            st.dataframe(
+                items_of_selected_receipt,
+                hide_index=True,
+                use_container_width=True,
+            )
+    else:
+        st.info("No receipts match the current filters.")
+
+
+@st.fragment
+def render_developer_tools():
+    """
+    Renders the raw data inspector and the failed receipts queue as a fragment,
+    isolated from reruns triggered by the rest of the dashboard's widgets.
+    """
+    st.subheader("Raw Data Inspector")
+
+    df_items, items_count = load_raw_items()
+    if items_count > len(df_items):
+        st.caption(f"Showing the first {len(df_items)} of {items_count} items.")
+    st.dataframe(df_items)
+
+    st.divider()
+    st.subheader("Failed Receipts Queue")
+
+    df_failed, failed_count = load_failed_receipts()
+
+    if df_failed.empty:
+        st.success("No failed receipts found. All clear!")
+    else:
+        st.warning(f"Found {failed_count} failed receipts.")
+        if failed_count > len(df_failed):
+            st.caption(f"Showing the first {len(df_failed)}.")
+        st.dataframe(df_failed[["receipt_date", "merchant", "status"]])
+
+        if st.button("Retry All Failed Receipts", use_container_width=True):
+            try:
+                supabase.table("receipts").update({"status": "pending"}).eq(
+                    "status", "failed"
+                ).execute()
+
+                st.success("All failed receipts have been reset to 'pending'.")
+
+                st.cache_data.clear()
+                st.rerun()
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
 
 
 # MAIN APP
@@ -123,8 +375,8 @@ def main():
         f"Welcome, {st.session_state.role} | Today is {date.today().strftime('%B %d, %Y')}"
     )
 
-    df_full = load_data()
-    if df_full.empty:
+    filter_options = load_filter_options()
+    if filter_options is None:
         st.warning("No data found in the database. Please generate some data first.")
         return
 
@@ -132,8 +384,8 @@ def main():
     st.sidebar.header("Filters & Controls")
 
     # Date Range Filter
-    min_date = df_full["receipt_date"].min().date()
-    max_date = df_full["receipt_date"].max().date()
+    min_date = filter_options["min_date"]
+    max_date = filter_options["max_date"]
 
     date_range = st.sidebar.date_input(
         "Select Date Range",
@@ -148,7 +400,7 @@ def main():
     else:
         start_date, end_date = min_date, max_date
 
-    all_categories = sorted(df_full["category"].unique())
+    all_categories = filter_options["categories"]
     selected_categories = st.sidebar.multiselect(
         "Select Categories",
         all_categories,
@@ -156,18 +408,25 @@ def main():
         key="category_filter",
     )
 
-    all_merchants = sorted(df_full["merchant"].unique())
+    all_merchants = filter_options["merchants"]
     selected_merchants = st.sidebar.multiselect(
         "Select Merchants", all_merchants, default=all_merchants, key="merchant_filter"
     )
 
     # FILTERING LOGIC
-    df_filtered = df_full[
-        (df_full["receipt_date"].dt.date >= start_date)
-        & (df_full["receipt_date"].dt.date <= end_date)
-        & (df_full["category"].isin(selected_categories))
-        & (df_full["merchant"].isin(selected_merchants))
-    ].copy()
+    # The filters are passed to Postgres, which returns only aggregated rows
+    filters = (
+        start_date,
+        end_date,
+        tuple(selected_categories),
+        tuple(selected_merchants),
+    )
+    # One row per receipt, shared by the KPIs and the detail viewer
+    receipt_totals = load_filtered_kpi(
+        "kpi_by_receipt",
+        ("receipt_id", "receipt_date", "merchant", "total_price"),
+        *filters,
+    )
 
     # SIDEBAR BUTTONS
     st.sidebar.divider()
@@ -193,18 +452,22 @@ def main():
             st.rerun()
 
     # MAIN PAGE LAYOUT
-    if df_filtered.empty:
+    if receipt_totals.empty:
         st.warning("No data matches the current filter settings.")
         return
 
     # KPIs SECTION
     st.header("Key Performance Indicators")
-    total_expenses = df_filtered["total_price"].sum()
-    num_receipts = df_filtered["receipt_id"].nunique()
+    total_expenses = receipt_totals["total_price"].sum()
+    num_receipts = len(receipt_totals)
     avg_per_receipt = total_expenses / num_receipts if num_receipts > 0 else 0
+    # Shared by the "Top Category" KPI and the "Expenses by Category" chart
+    category_spending = load_filtered_kpi(
+        "kpi_by_category", ("category", "total_price"), *filters
+    )
     top_category = (
-        df_filtered.groupby("category")["total_price"].sum().idxmax()
-        if not df_filtered.empty
+        category_spending.at[category_spending["total_price"].idxmax(), "category"]
+        if not category_spending.empty
         else "N/A"
     )
 
@@ -220,9 +483,6 @@ def main():
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Expenses by Category")
-        category_spending = (
-            df_filtered.groupby("category")["total_price"].sum().reset_index()
-        )
         fig_cat = px.bar(
             category_spending,
             x="category",
@@ -234,13 +494,11 @@ def main():
 
     with col2:
         st.subheader("Expenses Over Time")
-        daily_spending = (
-            df_filtered.groupby(df_filtered["receipt_date"].dt.date)["total_price"]
-            .sum()
-            .reset_index()
+        daily_spending = load_filtered_kpi(
+            "kpi_by_day", ("receipt_date", "total_price"), *filters
         )
         fig_time = px.line(
-            daily_spending,
+            downsample_lttb(daily_spending, "receipt_date", "total_price"),
             x="receipt_date",
             y="total_price",
             title="Daily Spending",
@@ -253,39 +511,19 @@ def main():
     st.divider()
     st.header("Analysis by Merchant")
 
-    if not df_filtered.empty:
-        receipt_totals = (
-            df_filtered.groupby(["receipt_id", "merchant"])["total_price"]
-            .sum()
-            .reset_index()
-        )
-        avg_receipt_by_merchant = (
-            receipt_totals.groupby("merchant")["total_price"].mean().reset_index()
-        )
-        avg_receipt_by_merchant.rename(
-            columns={"total_price": "Average Receipt (€)"}, inplace=True
-        )
-
-        category_spending_per_merchant = (
-            df_filtered.groupby(["merchant", "category"])["total_price"]
-            .sum()
-            .reset_index()
-        )
-        dominant_category_idx = category_spending_per_merchant.groupby("merchant")[
-            "total_price"
-        ].idxmax()
-        dominant_category_by_merchant = category_spending_per_merchant.loc[
-            dominant_category_idx
-        ][["merchant", "category"]]
-        dominant_category_by_merchant.rename(
-            columns={"category": "Dominant Category"}, inplace=True
-        )
-
-        merchant_stats_df = pd.merge(
-            avg_receipt_by_merchant, dominant_category_by_merchant, on="merchant"
+    if not receipt_totals.empty:
+        merchant_stats_df = load_filtered_kpi(
+            "kpi_by_merchant",
+            ("merchant", "average_receipt", "dominant_category"),
+            *filters,
         )
         merchant_stats_df = merchant_stats_df.sort_values(
-            by="Average Receipt (€)", ascending=False
+            by="average_receipt", ascending=False
+        ).rename(
+            columns={
+                "average_receipt": "Average Receipt (€)",
+                "dominant_category": "Dominant Category",
+            }
         )
 
         st.subheader("Merchant Statistics")
@@ -302,35 +540,24 @@ def main():
     st.divider()
     st.header("Monthly Analysis")
 
-    if not df_full.empty:
-        df_monthly_full = df_full.copy()
-        df_monthly_full["month_period"] = df_monthly_full["receipt_date"].dt.to_period(
-            "M"
-        )
-        monthly_summary = (
-            df_monthly_full.groupby("month_period")["total_price"].sum().reset_index()
-        )
+    if filter_options is not None:
+        monthly_summary = load_monthly_summary()
 
         today = date.today()
         current_month_period = pd.Period(today, "M")
         previous_month_period = current_month_period - 1
 
-        current_month_spend_series = monthly_summary[
-            monthly_summary["month_period"] == current_month_period
-        ]["total_price"]
-        current_month_spend = current_month_spend_series.sum()
-
-        previous_month_spend_series = monthly_summary[
-            monthly_summary["month_period"] == previous_month_period
-        ]["total_price"]
-        previous_month_spend = previous_month_spend_series.sum()
+        # Month lookups on a period-indexed view instead of boolean-mask copies
+        monthly_totals = monthly_summary.set_index("month_period")["total_price"]
+        current_month_spend = monthly_totals.get(current_month_period, 0.0)
+        previous_month_spend = monthly_totals.get(previous_month_period, 0.0)
 
-        historical_monthly_summary = monthly_summary[
-            monthly_summary["month_period"] < current_month_period
+        historical_monthly_totals = monthly_totals[
+            monthly_totals.index < current_month_period
         ]
         average_monthly_spend = (
-            historical_monthly_summary["total_price"].mean()
-            if not historical_monthly_summary.empty
+            historical_monthly_totals.mean()
+            if not historical_monthly_totals.empty
             else 0
         )
 
@@ -382,8 +609,6 @@ def main():
             delta_color="inverse",
         )
 
-        monthly_summary["Month"] = monthly_summary["month_period"].dt.strftime("%Y-%m")
-
         col1, col2 = st.columns([1, 2])
         with col1:
             st.subheader("Historical Spending")
@@ -413,79 +638,12 @@ def main():
 
     # DETAILED DATA SECTION
     with st.expander("View Detailed Item Data", expanded=True):
-        if not df_filtered.empty:
-            receipt_summary = (
-                df_filtered.groupby(["receipt_id", "receipt_date", "merchant"])[
-                    "total_price"
-                ]
-                .sum()
-                .reset_index()
-            )
-
-            receipt_summary = receipt_summary.sort_values(
-                by="receipt_date", ascending=False
-            )
-
-            receipt_summary["display_label"] = receipt_summary.apply(
-                lambda row: f"{row['receipt_date'].strftime('%Y-%m-%d')} - {row['merchant']} ({row['total_price']:.2f}€)",
-                axis=1,
-            )
-
-            receipt_options = receipt_summary["display_label"].tolist()
-            selected_receipt_label = st.selectbox(
-                "Select a specific receipt to view its items:", receipt_options
-            )
-
-            if selected_receipt_label:
-                selected_receipt_id = receipt_summary[
-                    receipt_summary["display_label"] == selected_receipt_label
-                ]["receipt_id"].iloc[0]
-
-                items_of_selected_receipt = df_filtered[
-                    df_filtered["receipt_id"] == selected_receipt_id
-                ]
-
-                st.dataframe(
-                    items_of_selected_receipt[
-                        ["name", "quantity", "price", "total_price", "category"]
-                    ],
-                    hide_index=True,
-                    use_container_width=True,
-                )
-        else:
-            st.info("No receipts match the current filters.")
+        render_receipt_details(receipt_totals, selected_categories)
 
     # DEVELOPER SECTION
     if st.session_state.role == "developer":
         with st.expander("Developer Tools"):
-            st.subheader("Raw Data Inspector")
-            st.dataframe(df_full)
-
-            st.divider()
-            st.subheader("Failed Receipts Queue")
-
-            df_failed = df_full[df_full["status"] == "failed"]
-
-            df_failed_unique = df_failed.drop_duplicates(subset=["receipt_id"])
-
-            if df_failed_unique.empty:
-                st.success("No failed receipts found. All clear!")
-            else:
-                st.warning(f"Found {len(df_failed_unique)} failed receipts.")
-                st.dataframe(df_failed_unique[["receipt_date", "merchant", "status"]])
-
-                if st.button("Retry All Failed Receipts", use_container_width=True):
-                    try:
-                        supabase.table("receipts").update({"status": "pending"}).eq(
-                            "status", "failed"
-                        ).execute()
-
-                        st.success("All failed receipts have been reset to 'pending'.")
-
-                        st.cache_data.clear()
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"An error occurred: {e}")
+            render_developer_tools()
 
 
 # RUN THE APP
@@ -1,19 +1,10 @@
-import sys
-import random
-from faker import Faker
-from supabase import create_client, Client
-from decimal import Decimal
+import numpy as np
+from datetime import date
 
+from receipty.data_generation.supabase_client import supabase
 
-try:
-    from receipty.config import settings
-except ImportError:
-    print("Error: Could not import 'settings' from 'src.receipty.config'.")
-    print("Please ensure the file exists and the path is correct.")
-    sys.exit(1)
 
-supabase: Client = create_client(settings.supabase_url, settings.supabase_api_key)
-fake = Faker("fr_FR")  # Use the French locale for Faker
+rng = np.random.default_rng()
 
 # SIMULATION DATA
 COHERENT_ITEMS_BY_CATEGORY = {
@@ -66,7 +57,19 @@ COHERENT_ITEMS_BY_CATEGORY = {
         "Loyer",
     ],
 }
-CATEGORIES = list(COHERENT_ITEMS_BY_CATEGORY.keys())
+# Every (category, item) pair, so one draw picks both
+FLAT_ITEMS = [
+    (category, item)
+    for category, items in COHERENT_ITEMS_BY_CATEGORY.items()
+    for item in items
+]
+# Pick probabilities of those pairs: every category is equally likely whatever
+# its number of items, then every item within its category
+FLAT_ITEM_WEIGHTS = [
+    1 / (len(COHERENT_ITEMS_BY_CATEGORY) * len(items))
+    for items in COHERENT_ITEMS_BY_CATEGORY.values()
+    for _ in items
+]
 MERCHANTS = [
     "Carrefour",
     "Fnac",
@@ -78,82 +81,115 @@ MERCHANTS = [
     "SNCF",
 ]
 FAKE_USER_ID = "00000000-0000-0000-0000-000000000000"
+# Receipts per batch when seeding in bulk
+BULK_BATCH_SIZE = 1000
+# Item rows per insert request, to stay well under PostgREST request size limits
+ITEMS_INSERT_BATCH_SIZE = 1000
 
 
-def generate_clean_data(num_receipts=10):
+def _insert_clean_receipts(num_receipts):
     """
-    Populates the database with clean, fake receipts and their associated items,
+    Generates one batch of clean, fake receipts and their items and inserts them
+    (one request for the receipts, size-bounded requests for the items),
     ensuring the total amount of each receipt matches the sum of its items.
     """
-    print("Starting clean data generation...")
-
-    for i in range(num_receipts):
-        # --- NEW LOGIC STEP 1: Generate items in memory and calculate their sum ---
-        num_items = random.randint(2, 8)
-        items_to_insert = []
-        calculated_total = Decimal("0.0")
-
-        for _ in range(num_items):
-            item_category = random.choice(CATEGORIES)
-            item_name = random.choice(COHERENT_ITEMS_BY_CATEGORY[item_category])
-            price = Decimal(str(round(random.uniform(0.5, 50.0), 2)))
-            quantity = random.randint(1, 5)
-
-            calculated_total += price * quantity
-
-            item_data = {
-                # 'receipt_id' will be added later
-                "name": item_name,
-                "price": float(
-                    price
-                ),  # Convert Decimal to float for JSON serialization
-                "quantity": quantity,
-                "category": item_category,
-            }
-            items_to_insert.append(item_data)
-
-        # --- NEW LOGIC STEP 2: Create the receipt with the calculated total ---
-        receipt_data = {
+    # Step 1: draw every random value in bulk, then build the rows in memory
+    num_items_per_receipt = rng.integers(2, 9, size=num_receipts)
+    total_items = int(num_items_per_receipt.sum())
+    flat_item_indices = rng.choice(
+        len(FLAT_ITEMS), size=total_items, p=FLAT_ITEM_WEIGHTS
+    ).tolist()
+    # Prices are drawn in integer cents (0.50 to 50.00 €), so no float rounding
+    prices_cents = rng.integers(50, 5001, size=total_items).tolist()
+    quantities = rng.integers(1, 6, size=total_items).tolist()
+    merchants = rng.choice(MERCHANTS, size=num_receipts).tolist()
+    # Receipt dates within the last year, as ISO strings, in one vectorized pass
+    day_offsets = rng.integers(0, 366, size=num_receipts).astype("timedelta64[D]")
+    receipt_dates = (np.datetime64(date.today()) - day_offsets).astype(str).tolist()
+
+    # Receipt totals summed per receipt in integer cents, straight from the columns
+    line_totals_cents = np.multiply(prices_cents, quantities)
+    receipt_starts = np.cumsum(num_items_per_receipt) - num_items_per_receipt
+    totals_cents = np.add.reduceat(line_totals_cents, receipt_starts).tolist()
+
+    receipts_to_insert = [
+        {
             "user_id": FAKE_USER_ID,
-            "merchant": random.choice(MERCHANTS),
-            "receipt_date": fake.date_between(
-                start_date="-1y", end_date="today"
-            ).isoformat(),
-            "total_amount": float(calculated_total),  # Use the calculated total
+            "merchant": merchant,
+            "receipt_date": receipt_date,
+            "total_amount": total_cents / 100,
             "status": "processed",
         }
+        for merchant, receipt_date, total_cents in zip(
+            merchants, receipt_dates, totals_cents
+        )
+    ]
+
+    # Step 2: create all receipts in a single request
+    try:
+        response_receipts = (
+            supabase.table("receipts").insert(receipts_to_insert).execute()
+        )
+        print(f"Created {len(response_receipts.data)} receipts.")
+    except Exception as e:
+        print(f"Error creating receipts: {e}")
+        return
+
+    # Step 3: build the item rows from the columns only now that the receipt ids
+    # are known (same order as the payload), then insert them in size-bounded batches
+    receipt_ids = [created_receipt["id"] for created_receipt in response_receipts.data]
+    item_receipt_indices = np.repeat(
+        np.arange(num_receipts), num_items_per_receipt
+    ).tolist()
+    all_items = [
+        {
+            "receipt_id": receipt_ids[receipt_index],
+            "name": FLAT_ITEMS[item_index][1],
+            "price": price_cents / 100,
+            "quantity": quantity,
+            "category": FLAT_ITEMS[item_index][0],
+        }
+        for receipt_index, item_index, price_cents, quantity in zip(
+            item_receipt_indices, flat_item_indices, prices_cents, quantities
+        )
+    ]
+
+    try:
+        for batch_start in range(0, len(all_items), ITEMS_INSERT_BATCH_SIZE):
+            items_batch = all_items[batch_start : batch_start + ITEMS_INSERT_BATCH_SIZE]
+            supabase.table("items").insert(items_batch).execute()
+        print(f"  -> Added {len(all_items)} items.")
+    except Exception as e:
+        print(f"Error adding items: {e}")
 
-        try:
-            response_receipt = supabase.table("receipts").insert(receipt_data).execute()
-            new_receipt_id = response_receipt.data[0]["id"]
-            print(
-                f"Created receipt for '{receipt_data['merchant']}' with ID: {new_receipt_id} (Total: {calculated_total:.2f} €)"
-            )
-        except Exception as e:
-            print(f"Error creating receipt: {e}")
-            continue
-
-        # --- NEW LOGIC STEP 3: Add the receipt_id to each item and insert them ---
-        for item in items_to_insert:
-            item["receipt_id"] = new_receipt_id
-
-        try:
-            supabase.table("items").insert(items_to_insert).execute()
-            print(f"  -> Added {num_items} items for this receipt.")
-        except Exception as e:
-            print(f"Error adding items for receipt ID {new_receipt_id}: {e}")
 
+def generate_clean_data(num_receipts=10):
+    """
+    Populates the database with clean, fake receipts and their associated items,
+    ensuring the total amount of each receipt matches the sum of its items.
+    """
+    print("Starting clean data generation...")
+    _insert_clean_receipts(num_receipts)
+    print("\nData generation complete!")
+
+
+def generate_clean_data_bulk(num_receipts, batch_size=BULK_BATCH_SIZE):
+    """
+    Seeds the database with a large number of clean, fake receipts by inserting
+    them in fixed-size batches, so that no single request body grows with the
+    total number of receipts.
+    """
+    print(f"Starting bulk clean data generation ({num_receipts} receipts)...")
+    for batch_start in range(0, num_receipts, batch_size):
+        batch = min(batch_size, num_receipts - batch_start)
+        print(f"Batch {batch_start // batch_size + 1}: {batch} receipts")
+        _insert_clean_receipts(batch)
     print("\nData generation complete!")
 
 
 if __name__ == "__main__":
     print("Clearing existing tables...")
-    supabase.table("items").delete().neq(
-        "id", "00000000-0000-0000-0000-000000000000"
-    ).execute()
-    supabase.table("receipts").delete().neq(
-        "id", "00000000-0000-0000-0000-000000000000"
-    ).execute()
+    supabase.rpc("truncate_fake_data").execute()
 
     generate_clean_data(5)
 
@@ -1,19 +1,16 @@
-import sys
 import random
+from bisect import bisect
+from itertools import accumulate
+import numpy as np
 from faker import Faker
-from supabase import create_client, Client
+from datetime import date
 from decimal import Decimal, ROUND_HALF_UP
 
+from receipty.data_generation.supabase_client import supabase
 
-try:
-    from receipty.config import settings
-except ImportError:
-    print("Error: Could not import 'settings' from 'config.py'.")
-    print("Please ensure the file exists.")
-    sys.exit(1)
 
-supabase: Client = create_client(settings.supabase_url, settings.supabase_api_key)
 fake = Faker("fr_FR")
+rng = np.random.default_rng()
 
 COHERENT_ITEMS_BY_CATEGORY = {
     "Alimentation": [
@@ -116,19 +113,63 @@ TEMPLATE_CONFIG = {
     },
 }
 
+# Every item a template can sell, flattened across its categories so that a
+# single draw picks an item
+ITEMS_BY_TEMPLATE = {
+    template_type: [
+        item
+        for category in config["categories"]
+        for item in COHERENT_ITEMS_BY_CATEGORY[category]
+    ]
+    for template_type, config in TEMPLATE_CONFIG.items()
+}
+# Cumulative pick weights of those items: each category of a template is equally
+# likely whatever its number of items, then each item within its category
+ITEM_CUM_WEIGHTS_BY_TEMPLATE = {
+    template_type: list(
+        accumulate(
+            1 / (len(config["categories"]) * len(COHERENT_ITEMS_BY_CATEGORY[category]))
+            for category in config["categories"]
+            for _ in COHERENT_ITEMS_BY_CATEGORY[category]
+        )
+    )
+    for template_type, config in TEMPLATE_CONFIG.items()
+}
+
+TEMPLATE_TYPES = list(TEMPLATE_CONFIG.keys())
+
+# Receipt headers print the merchant in capitals; computed once per merchant
+MERCHANTS_UPPER = {
+    merchant: merchant.upper()
+    for config in TEMPLATE_CONFIG.values()
+    for merchant in config["merchants"]
+}
+
 FAKE_USER_ID = "00000000-0000-0000-0000-000000000000"
 VAT_RATE = Decimal("0.20")  # Define a 20% VAT rate
+CENT = Decimal("0.01")  # Rounding quantum for amounts printed on the receipt
 
 
-def _generate_receipt_items(allowed_categories):
+def _generate_receipt_items(
+    allowed_items, cum_weights, item_draws, quantities, prices_cents
+):
     """
-    Generates a list of item lines and calculates the total amount based on allowed categories.
+    Builds the item lines of one receipt from its slice of the pre-drawn values
+    and calculates their total amount.
     Returns a tuple containing the formatted text of the items and their total sum.
 
     Parameters
     ----------
-    allowed_categories : list[str]
-        A list of category names from which to randomly select items.
+    allowed_items : list[str]
+        The item names the receipt's template can sell.
+    cum_weights : list[float]
+        The cumulative pick weights of `allowed_items`.
+    item_draws : list[float]
+        One uniform draw in [0, 1) per item, used to pick its name.
+    quantities : list[int]
+        The quantity of each item.
+    prices_cents : list[int]
+        The unit price of each item, in cents.
 
     Returns
     -------
@@ -137,103 +178,205 @@ def _generate_receipt_items(allowed_categories):
         1. The formatted multi-line string of all item lines.
         2. The calculated total amount as a Decimal object.
     """
-    items_text = ""
-    total_amount = Decimal("0.0")
-    num_items = random.randint(2, 5)
-
-    for _ in range(num_items):
-        category = random.choice(allowed_categories)
-        item_name = random.choice(COHERENT_ITEMS_BY_CATEGORY[category])
-        quantity = random.randint(1, 3)
-        price = Decimal(str(round(random.uniform(1.5, 30.0), 2)))
-        line_total = price * quantity
-        total_amount += line_total
+    item_lines = []
+    total_cents = 0
+    total_weight = cum_weights[-1]
+
+    for item_draw, quantity, price_cents in zip(item_draws, quantities, prices_cents):
+        item_name = allowed_items[bisect(cum_weights, item_draw * total_weight)]
+        line_total = price_cents * quantity / 100
+        total_cents += price_cents * quantity
 
         item_line = f"{quantity} x {item_name:<20}"
-        items_text += f"{item_line:<25} {f'{line_total:.2f} EUR'}\n"
+        item_lines.append(f"{item_line:<25} {line_total:.2f} EUR\n")
 
-    return items_text, total_amount
+    return "".join(item_lines), Decimal(total_cents) / 100
 
 
-def generate_receipt_text():
+def _build_receipt_text(
+    template_type, merchant, date_str, time_str, address, items_text, total_amount
+):
     """
-    Randomly selects a template and generates a complete, realistic receipt text.
+    Builds the text of one receipt from its pre-drawn header values and item
+    lines, with a calculated total including VAT.
 
-    This function simulates the output of an Optical Character Recognition (OCR)
-    process on a French receipt by building a multi-line string with a random
-    merchant, items, and a calculated total including VAT.
+    Parameters
+    ----------
+    template_type : str
+        The key of the receipt template in TEMPLATE_CONFIG.
+    merchant : str
+        The merchant name printed at the top of the receipt.
+    date_str : str
+        The transaction date, formatted as 'DD/MM/YYYY'.
+    time_str : str
+        The transaction time, formatted as 'HH:MM:SS'.
+    address : str | None
+        The address block printed under the merchant name, if any.
+    items_text : str
+        The formatted item lines.
+    total_amount : Decimal
+        The sum of the item lines.
 
     Returns
     -------
     str
         A multi-line string simulating the raw text content of a French receipt.
     """
-    template_type = random.choice(list(TEMPLATE_CONFIG.keys()))
+    vat_amount = (total_amount * VAT_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
 
-    config = TEMPLATE_CONFIG[template_type]
-    merchant = random.choice(config["merchants"])
-    allowed_categories = config["categories"]
+    parts = [f"{MERCHANTS_UPPER[merchant]}\n"]
+    if address is not None:
+        parts.append(address)
 
-    date_str = fake.date_this_year().strftime("%d/%m/%Y")
-    time_str = fake.time(pattern="%H:%M:%S")
+    parts.append(f"\nDate: {date_str}   Heure: {time_str}\n")
+    parts.append("--------------------------------------\n")
+    parts.append(items_text)
+    parts.append("--------------------------------------\n")
 
-    items_text, total_amount = _generate_receipt_items(allowed_categories)
+    if template_type != "gas_station":
+        parts.append(f"SOUS-TOTAL                 {total_amount:.2f} EUR\n")
+        parts.append(f"DONT TVA ({VAT_RATE:.0%})             {vat_amount:.2f} EUR\n")
 
-    vat_amount = (total_amount * VAT_RATE).quantize(
-        Decimal("0.01"), rounding=ROUND_HALF_UP
-    )
+    parts.append(f"TOTAL A PAYER              {total_amount:.2f} EUR\n\n")
+    parts.append("MERCI DE VOTRE VISITE\n")
+
+    return "".join(parts)
+
+
+def generate_receipt_texts(num_receipts):
+    """
+    Generates complete, realistic receipt texts, each from a randomly selected template.
+
+    This function simulates the output of an Optical Character Recognition (OCR)
+    process on French receipts. The header values of all receipts (templates,
+    merchants, dates, times and supermarket addresses) and of all their items are
+    drawn up front in bulk, then each receipt is built as a multi-line string from
+    its slice of the draws, with a calculated total including VAT.
+
+    Parameters
+    ----------
+    num_receipts : int
+        The number of receipt texts to generate.
 
-    text_block = f"{merchant.upper()}\n"
-    if template_type == "supermarket":
-        text_block += (
+    Returns
+    -------
+    list[str]
+        The multi-line strings simulating the raw text content of French receipts.
+    """
+    template_types = random.choices(TEMPLATE_TYPES, k=num_receipts)
+    merchants = [
+        random.choice(TEMPLATE_CONFIG[template_type]["merchants"])
+        for template_type in template_types
+    ]
+
+    # Dates between January 1st and today, times anywhere in the day
+    today = date.today()
+    year_start = date(today.year, 1, 1)
+    day_offsets = rng.integers(0, (today - year_start).days + 1, size=num_receipts)
+    iso_dates = (np.datetime64(year_start) + day_offsets).astype(str).tolist()
+    date_strs = [f"{iso[8:10]}/{iso[5:7]}/{iso[:4]}" for iso in iso_dates]
+    seconds = rng.integers(0, 24 * 3600, size=num_receipts).tolist()
+    time_strs = [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds]
+
+    # Faker is only needed for the supermarket address blocks
+    addresses = [
+        (
             f"{fake.street_address()}\n{fake.postcode()} {fake.city().upper()}\n"
+            if template_type == "supermarket"
+            else None
         )
+        for template_type in template_types
+    ]
 
-    text_block += f"\nDate: {date_str}   Heure: {time_str}\n"
-    text_block += "--------------------------------------\n"
-    text_block += items_text
-    text_block += "--------------------------------------\n"
+    # Items of every receipt in one draw per field (2 to 5 items per receipt),
+    # sliced per receipt below: per-receipt numpy calls cost more than they save
+    item_ends = np.cumsum(rng.integers(2, 6, size=num_receipts)).tolist()
+    total_items = item_ends[-1] if item_ends else 0
+    item_draws = rng.random(total_items).tolist()
+    quantities = rng.integers(1, 4, size=total_items).tolist()
+    # Prices in integer cents (1.50 to 30.00 €): exact sums without Decimal
+    prices_cents = rng.integers(150, 3001, size=total_items).tolist()
 
-    if template_type != "gas_station":
-        text_block += f"SOUS-TOTAL                 {f'{total_amount:.2f} EUR'}\n"
-        text_block += (
-            f"DONT TVA ({VAT_RATE:.0%})             {f'{vat_amount:.2f} EUR'}\n"
+    receipt_texts = []
+    start = 0
+    for template_type, merchant, date_str, time_str, address, end in zip(
+        template_types, merchants, date_strs, time_strs, addresses, item_ends
+    ):
+        items_text, total_amount = _generate_receipt_items(
+            ITEMS_BY_TEMPLATE[template_type],
+            ITEM_CUM_WEIGHTS_BY_TEMPLATE[template_type],
+            item_draws[start:end],
+            quantities[start:end],
+            prices_cents[start:end],
         )
+        receipt_texts.append(
+            _build_receipt_text(
+                template_type,
+                merchant,
+                date_str,
+                time_str,
+                address,
+                items_text,
+                total_amount,
+            )
+        )
+        start = end
+
+    return receipt_texts
+
 
-    text_block += f"TOTAL A PAYER              {f'{total_amount:.2f} EUR'}\n\n"
-    text_block += "MERCI DE VOTRE VISITE\n"
+def generate_receipt_text():
+    """
+    Randomly selects a template and generates a complete, realistic receipt text.
 
-    return text_block
+    Returns
+    -------
+    str
+        A multi-line string simulating the raw text content of a French receipt.
+    """
+    return generate_receipt_texts(1)[0]
 
 
 def simulate_ocr_insertion(num_receipts=5):
     """
-    Inserts raw OCR-like text into the 'receipts' table.
+    Inserts a specified number of raw, OCR-like text records into the 'receipts' table.
+
+    This function simulates the initial data ingestion step where raw text from an
+    OCR process is stored. It calls `generate_receipt_texts()` to create all the
+    text blocks at once, then inserts all rows into the database in a single
+    request. It populates only the essential fields ('user_id', 'extracted_text',
+    'status') to prepare the records for subsequent processing by an LLM.
+
+    Parameters
+    ----------
+    num_receipts : int, optional
+        The number of raw receipt records to generate and insert. Defaults to 5.
+
+    Returns
+    -------
+    None
+        This function does not return any value; it prints its progress to the console.
     """
     print("Starting OCR input simulation...")
-    for i in range(num_receipts):
-        ocr_text = generate_receipt_text()
-        receipt_to_insert = {
+    receipts_to_insert = [
+        {
             "user_id": FAKE_USER_ID,
             "extracted_text": ocr_text,
             "status": "pending",
         }
-        try:
-            response = supabase.table("receipts").insert(receipt_to_insert).execute()
-            new_id = response.data[0]["id"]
-            print(f"Successfully inserted raw receipt. ID: {new_id}")
-        except Exception as e:
-            print(f"Error inserting raw receipt: {e}")
+        for ocr_text in generate_receipt_texts(num_receipts)
+    ]
+    try:
+        response = supabase.table("receipts").insert(receipts_to_insert).execute()
+        for new_receipt in response.data:
+            print(f"Successfully inserted raw receipt. ID: {new_receipt['id']}")
+    except Exception as e:
+        print(f"Error inserting raw receipts: {e}")
 
 
 if __name__ == "__main__":
     print("Clearing existing tables...")
-    supabase.table("items").delete().neq(
-        "id", "00000000-0000-0000-0000-000000000000"
-    ).execute()
-    supabase.table("receipts").delete().neq(
-        "id", "00000000-0000-0000-0000-000000000000"
-    ).execute()
+    supabase.rpc("truncate_fake_data").execute()
     simulate_ocr_insertion(10)
 
     response = supabase.table("receipts").select("id", count="exact").execute()
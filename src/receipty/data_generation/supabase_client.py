@@ -0,0 +1,24 @@
+import sys
+import httpx
+from supabase import create_client, Client, ClientOptions
+
+
+try:
+    from receipty.config import settings
+except ImportError:
+    print("Error: Could not import 'settings' from 'src.receipty.config'.")
+    print("Please ensure the file exists and the path is correct.")
+    sys.exit(1)
+
+# Single Supabase client shared by the data generation scripts, backed by one
+# pooled HTTP client so connections are kept alive and reused instead of paying
+# a TCP and TLS handshake per request.
+http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+    timeout=120,
+)
+supabase: Client = create_client(
+    settings.supabase_url,
+    settings.supabase_api_key,
+    options=ClientOptions(httpx_client=http_client),
+)
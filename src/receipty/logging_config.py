@@ -0,0 +1,39 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+def configure_logging(level: str = "INFO") -> QueueListener:
+    """
+    Configures the 'receipty' loggers to write through a queue.
+
+    Coroutines only enqueue log records; a background thread owned by the
+    returned listener performs the actual (blocking) console I/O, so logging
+    never stalls the event loop while many receipts are processed concurrently.
+
+    Parameters
+    ----------
+    level : str
+        The minimum log level, e.g. 'INFO' or 'DEBUG'.
+
+    Returns
+    -------
+    QueueListener
+        The started listener. Call `stop()` on shutdown to flush pending records.
+    """
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    )
+
+    logger = logging.getLogger("receipty")
+    logger.setLevel(level.upper())
+    logger.handlers = [QueueHandler(log_queue)]
+    logger.propagate = False
+
+    listener = QueueListener(log_queue, console_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,4 +1,12 @@
-from pydantic import BaseModel, Field, field_validator, model_validator, PositiveInt
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    field_validator,
+    model_validator,
+    PositiveInt,
+)
+import re
 from enum import Enum
 from typing import List, Optional
 from datetime import date, datetime
@@ -28,12 +36,22 @@ class Categories(str, Enum):
     AUTRE = "Autre"
 
 
+# Allowed gap between the receipt total and the sum of its items
+_TOTAL_TOLERANCE = Decimal("0.02")
+
+# Currency markers the LLM may leave around amounts; Decimal() itself accepts
+# surrounding whitespace, so removing them is a single pass over the string
+_CURRENCY_RE = re.compile("€|EUR")
+
+
 # Model representing a single item extracted by the LLM
 
 
 class ItemData(BaseModel):
     """Represents a single item extracted from the receipt text by the LLM."""
 
+    model_config = ConfigDict(frozen=True)
+
     name: str = Field(..., min_length=1, description="The name of the item purchased.")
     quantity: PositiveInt = Field(
         ..., description="The quantity of the item purchased (must be 1 or more)."
@@ -52,7 +70,7 @@ class ItemData(BaseModel):
     def price_must_be_decimal(cls, value):
         try:
             if isinstance(value, str):
-                value = value.replace("€", "").replace("EUR", "").strip()
+                value = _CURRENCY_RE.sub("", value)
             dec_value = Decimal(value)
             if dec_value < 0:
                 raise ValueError("Line item price must be non-negative")
@@ -70,6 +88,8 @@ class StructuredReceiptData(BaseModel):
     This model serves as the contract for the LLM's output and includes validation.
     """
 
+    model_config = ConfigDict(frozen=True)
+
     merchant: str = Field(..., min_length=1, description="The name of the merchant.")
     receipt_date: date = Field(
         ..., description="The date of the transaction (YYYY-MM-DD format)."
@@ -89,7 +109,7 @@ class StructuredReceiptData(BaseModel):
         try:
             # Handle potential currency symbols or spaces returned by LLM
             if isinstance(value, str):
-                value = value.replace("€", "").replace("EUR", "").strip()
+                value = _CURRENCY_RE.sub("", value)
             dec_value = Decimal(value)
             if dec_value < 0:
                 raise ValueError("Total amount must be non-negative")
@@ -100,13 +120,16 @@ class StructuredReceiptData(BaseModel):
     @field_validator("receipt_date", mode="before")
     @classmethod
     def parse_date(cls, value):
-        # Allow LLM to return date as string, parse it here
-        if isinstance(value, str):
+        # Allow LLM to return date as string, parse it here. Exact type checks:
+        # strings are the common case (the LLM output is validated from JSON),
+        # and datetimes, a date subclass, are rejected rather than passed through
+        value_type = type(value)
+        if value_type is str:
             try:
                 return date.fromisoformat(value)
             except ValueError:
                 raise ValueError("Date must be in YYYY-MM-DD format")
-        elif isinstance(value, date):
+        if value_type is date:
             return value
         raise ValueError("Date must be a string in YYYY-MM-DD format or a date object")
 
@@ -116,11 +139,13 @@ class StructuredReceiptData(BaseModel):
         Validates that the sum of all item line prices
         approximately matches the total_amount.
         """
-        calculated_sum = sum(item.line_price for item in self.items)
-        # Allow a small tolerance for potential rounding differences
-        tolerance = Decimal("0.02")
+        # Plain loop with a local accumulator: cheaper than sum() over a generator
+        calculated_sum = Decimal(0)
+        for item in self.items:
+            calculated_sum += item.line_price
 
-        if abs(calculated_sum - self.total_amount) > tolerance:
+        # Allow a small tolerance for potential rounding differences
+        if abs(calculated_sum - self.total_amount) > _TOTAL_TOLERANCE:
             raise ValueError(
                 f"Sum of item totals ({calculated_sum:.2f}) does not match "
                 f"the receipt total amount ({self.total_amount:.2f}) within tolerance."
@@ -134,6 +159,8 @@ class StructuredReceiptData(BaseModel):
 class ReceiptDB(BaseModel):
     """Represents a row in the 'receipts' database table."""
 
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     id: UUID
     user_id: UUID
     created_at: Optional[datetime] = None
@@ -151,13 +178,12 @@ class ReceiptDB(BaseModel):
         None, description="Total amount extracted by LLM."
     )
 
-    class Config:
-        from_attributes = True
-
 
 class ItemDB(BaseModel):
     """Represents a row in the 'items' database table."""
 
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     id: UUID
     receipt_id: UUID = Field(
         ..., description="Foreign key linking to the 'receipts' table."
@@ -169,9 +195,6 @@ class ItemDB(BaseModel):
     quantity: PositiveInt = Field(..., description="Quantity purchased.")
     category: Categories = Field(..., description="Expense category.")
 
-    class Config:
-        from_attributes = True
-
 
 # Modèle de réponse générique API
 class MessageResponse(BaseModel):
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+
+from receipty.api.LLM_processor import openai_http_client, process_pending_receipts
+from receipty.api.supabase_client import http_client as supabase_http_client
+from receipty.config import get_settings
+from receipty.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+async def run_worker() -> None:
+    """
+    Processes pending receipts continuously, in a process separate from the API.
+
+    The 'receipts' table acts as the durable job queue: each batch is claimed
+    atomically with `FOR UPDATE SKIP LOCKED`, so several workers can run side by
+    side and restarting the API does not affect queued receipts. Receipts still
+    in flight are put back to 'pending' when the worker is stopped, and claims
+    stranded by a crash are taken over by `claim_pending_receipts` once they
+    are older than its stale-claim timeout. The worker polls again right away
+    while receipts keep coming, and sleeps for the configured interval once
+    the queue is empty or the LLM circuit breaker is open.
+    """
+
+    poll_interval = get_settings().llm_worker_poll_interval
+    logger.info("Receipt worker started (poll interval: %.1fs).", poll_interval)
+
+    try:
+        while True:
+            claimed_count = await process_pending_receipts()
+            if claimed_count == 0:
+                await asyncio.sleep(poll_interval)
+    finally:
+        await openai_http_client.aclose()
+        await supabase_http_client.aclose()
+
+
+if __name__ == "__main__":
+    log_listener = configure_logging(get_settings().log_level)
+    try:
+        asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        logger.info("Receipt worker stopped.")
+    finally:
+        log_listener.stop()
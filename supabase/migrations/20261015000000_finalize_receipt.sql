@@ -0,0 +1,29 @@
+-- Saves the LLM extraction for a receipt in a single round-trip:
+-- updates the receipt's general info and inserts all of its items
+-- inside one transaction (the function body is atomic).
+create or replace function public.finalize_receipt(
+    p_receipt_id uuid,
+    p_meta jsonb,
+    p_items jsonb
+)
+returns void
+language plpgsql
+as $$
+begin
+    update public.receipts as r
+    set merchant = m.merchant,
+        receipt_date = m.receipt_date,
+        total_amount = m.total_amount,
+        status = m.status
+    from jsonb_populate_record(null::public.receipts, p_meta) as m
+    where r.id = p_receipt_id;
+
+    if not found then
+        raise exception 'Receipt % not found', p_receipt_id;
+    end if;
+
+    insert into public.items (receipt_id, name, quantity, price, category)
+    select p_receipt_id, i.name, i.quantity, i.price, i.category
+    from jsonb_populate_recordset(null::public.items, p_items) as i;
+end;
+$$;
@@ -0,0 +1,20 @@
+-- Atomically claims up to p_limit pending receipts for processing:
+-- marks them 'processing' and returns them in a single statement.
+-- FOR UPDATE SKIP LOCKED lets several workers claim concurrently
+-- without ever picking the same receipt twice.
+create or replace function public.claim_pending_receipts(p_limit integer)
+returns table (id uuid, extracted_text text)
+language sql
+as $$
+    update public.receipts as r
+    set status = 'processing'
+    where r.id in (
+        select p.id
+        from public.receipts as p
+        where p.status = 'pending'
+        order by p.created_at
+        limit p_limit
+        for update skip locked
+    )
+    returning r.id, r.extracted_text;
+$$;
@@ -0,0 +1,7 @@
+-- Validated LLM responses keyed by a hash of the receipt text, so identical
+-- texts (retries, re-runs, duplicate OCR uploads) skip the LLM call.
+create table if not exists public.llm_cache (
+    text_hash text primary key,
+    response text not null,
+    created_at timestamptz not null default now()
+);
@@ -0,0 +1,21 @@
+-- Indexes backing the dashboard joins, date ranges and category filters.
+create index if not exists idx_items_receipt_id on public.items (receipt_id);
+create index if not exists idx_receipts_date on public.receipts (receipt_date);
+create index if not exists idx_items_category on public.items (category);
+
+-- Total spending per month over the whole history, aggregated server-side so
+-- the dashboard's monthly analysis only transfers one row per month.
+create or replace function public.kpi_monthly()
+returns table (month date, total_price numeric)
+language sql
+stable
+as $$
+    select
+        date_trunc('month', r.receipt_date)::date as month,
+        sum(i.price * i.quantity) as total_price
+    from public.items as i
+    join public.receipts as r on r.id = i.receipt_id
+    where r.receipt_date is not null
+    group by 1
+    order by 1;
+$$;
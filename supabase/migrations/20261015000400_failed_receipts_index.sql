@@ -0,0 +1,5 @@
+-- Partial index for the dashboard's failed receipts queue: only the (few)
+-- failed rows are indexed, so the lookup stays small as processed rows grow.
+create index if not exists idx_receipts_status_failed
+    on public.receipts (status)
+    where status = 'failed';
@@ -0,0 +1,20 @@
+-- Line total stored once at write time, so readers select it instead of
+-- multiplying price by quantity for every row.
+alter table public.items
+    add column if not exists total_price numeric
+    generated always as (price * quantity) stored;
+
+create or replace function public.kpi_monthly()
+returns table (month date, total_price numeric)
+language sql
+stable
+as $$
+    select
+        date_trunc('month', r.receipt_date)::date as month,
+        sum(i.total_price) as total_price
+    from public.items as i
+    join public.receipts as r on r.id = i.receipt_id
+    where r.receipt_date is not null
+    group by 1
+    order by 1;
+$$;
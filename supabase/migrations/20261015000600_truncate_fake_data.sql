@@ -0,0 +1,12 @@
+-- Empties the receipts and items tables in one statement, for the data
+-- generation scripts that reseed a development database.
+create or replace function public.truncate_fake_data()
+returns void
+language sql
+as $$
+    truncate table public.items, public.receipts;
+$$;
+
+-- TRUNCATE bypasses row level security: only the service role may call it.
+revoke execute on function public.truncate_fake_data() from public, anon, authenticated;
+grant execute on function public.truncate_fake_data() to service_role;
@@ -0,0 +1,38 @@
+-- Time at which a receipt was last claimed, so claims stranded in 'processing'
+-- by a crashed or killed worker can be detected and taken over.
+alter table public.receipts
+    add column if not exists claimed_at timestamptz;
+
+-- Receipts already in 'processing' start their timeout now rather than
+-- being reclaimed immediately while a worker may still hold them.
+update public.receipts
+set claimed_at = now()
+where status = 'processing' and claimed_at is null;
+
+-- Claims up to p_limit receipts for processing: pending ones, and those left
+-- in 'processing' for longer than p_stale_after (the claiming worker died
+-- before finishing them). Marks them 'processing', stamps claimed_at and
+-- returns them in a single statement. FOR UPDATE SKIP LOCKED lets several
+-- workers claim concurrently without ever picking the same receipt twice.
+drop function if exists public.claim_pending_receipts(integer);
+
+create or replace function public.claim_pending_receipts(
+    p_limit integer,
+    p_stale_after interval default interval '15 minutes'
+)
+returns table (id uuid, extracted_text text)
+language sql
+as $$
+    update public.receipts as r
+    set status = 'processing', claimed_at = now()
+    where r.id in (
+        select p.id
+        from public.receipts as p
+        where p.status = 'pending'
+            or (p.status = 'processing' and p.claimed_at < now() - p_stale_after)
+        order by p.created_at
+        limit p_limit
+        for update skip locked
+    )
+    returning r.id, r.extracted_text;
+$$;
@@ -0,0 +1,73 @@
+-- Token identifying the claim that currently owns a receipt. Once a stale
+-- claim is taken over, the previous worker's token no longer matches, so its
+-- late writes are ignored instead of duplicating items or overwriting status.
+alter table public.receipts
+    add column if not exists claim_id uuid;
+
+-- Same claim as before, but every batch gets a fresh claim_id, returned with
+-- the receipts so the worker can prove ownership when it writes them back.
+drop function if exists public.claim_pending_receipts(integer, interval);
+
+create or replace function public.claim_pending_receipts(
+    p_limit integer,
+    p_stale_after interval default interval '15 minutes'
+)
+returns table (id uuid, extracted_text text, claim_id uuid)
+language sql
+as $$
+    with claim as (
+        select gen_random_uuid() as claim_id
+    )
+    update public.receipts as r
+    set status = 'processing',
+        claimed_at = now(),
+        claim_id = (select c.claim_id from claim as c)
+    where r.id in (
+        select p.id
+        from public.receipts as p
+        where p.status = 'pending'
+            or (p.status = 'processing' and p.claimed_at < now() - p_stale_after)
+        order by p.created_at
+        limit p_limit
+        for update skip locked
+    )
+    returning r.id, r.extracted_text, r.claim_id;
+$$;
+
+-- Saves the LLM extraction for a receipt in a single round-trip, only if the
+-- caller still owns it (status 'processing' under the given claim): updates the
+-- receipt's general info and inserts all of its items inside one transaction.
+-- Returns false, without inserting anything, when the claim was lost.
+drop function if exists public.finalize_receipt(uuid, jsonb, jsonb);
+
+create or replace function public.finalize_receipt(
+    p_receipt_id uuid,
+    p_claim_id uuid,
+    p_meta jsonb,
+    p_items jsonb
+)
+returns boolean
+language plpgsql
+as $$
+begin
+    update public.receipts as r
+    set merchant = m.merchant,
+        receipt_date = m.receipt_date,
+        total_amount = m.total_amount,
+        status = m.status
+    from jsonb_populate_record(null::public.receipts, p_meta) as m
+    where r.id = p_receipt_id
+        and r.status = 'processing'
+        and r.claim_id = p_claim_id;
+
+    if not found then
+        return false;
+    end if;
+
+    insert into public.items (receipt_id, name, quantity, price, category)
+    select p_receipt_id, i.name, i.quantity, i.price, i.category
+    from jsonb_populate_recordset(null::public.items, p_items) as i;
+
+    return true;
+end;
+$$;
@@ -0,0 +1,149 @@
+-- Filter-dependent dashboard aggregates, computed server-side so the dashboard
+-- only transfers aggregated rows instead of every item. All of them take the
+-- sidebar filters: an inclusive date range and the selected categories and
+-- merchants.
+
+-- Item line totals matching the filters, shared by the aggregates below.
+create or replace function public.dashboard_filtered_items(
+    p_start date,
+    p_end date,
+    p_categories text[],
+    p_merchants text[]
+)
+returns table (
+    receipt_id uuid,
+    receipt_date date,
+    merchant text,
+    category text,
+    total_price numeric
+)
+language sql
+stable
+as $$
+    select
+        i.receipt_id,
+        r.receipt_date,
+        r.merchant::text,
+        i.category::text,
+        i.total_price
+    from public.items as i
+    join public.receipts as r on r.id = i.receipt_id
+    where r.receipt_date between p_start and p_end
+        and i.category::text = any(p_categories)
+        and r.merchant::text = any(p_merchants);
+$$;
+
+-- Total spending per category.
+create or replace function public.kpi_by_category(
+    p_start date,
+    p_end date,
+    p_categories text[],
+    p_merchants text[]
+)
+returns table (category text, total_price numeric)
+language sql
+stable
+as $$
+    select f.category, sum(f.total_price) as total_price
+    from public.dashboard_filtered_items(p_start, p_end, p_categories, p_merchants) as f
+    group by f.category
+    order by f.category;
+$$;
+
+-- Total spending per day.
+create or replace function public.kpi_by_day(
+    p_start date,
+    p_end date,
+    p_categories text[],
+    p_merchants text[]
+)
+returns table (receipt_date date, total_price numeric)
+language sql
+stable
+as $$
+    select f.receipt_date, sum(f.total_price) as total_price
+    from public.dashboard_filtered_items(p_start, p_end, p_categories, p_merchants) as f
+    group by f.receipt_date
+    order by f.receipt_date;
+$$;
+
+-- Average receipt and dominant category (highest spending) per merchant.
+create or replace function public.kpi_by_merchant(
+    p_start date,
+    p_end date,
+    p_categories text[],
+    p_merchants text[]
+)
+returns table (merchant text, average_receipt numeric, dominant_category text)
+language sql
+stable
+as $$
+    with filtered as (
+        select *
+        from public.dashboard_filtered_items(p_start, p_end, p_categories, p_merchants)
+    ),
+    receipt_totals as (
+        select f.merchant, f.receipt_id, sum(f.total_price) as total_price
+        from filtered as f
+        group by f.merchant, f.receipt_id
+    ),
+    category_totals as (
+        select f.merchant, f.category, sum(f.total_price) as total_price
+        from filtered as f
+        group by f.merchant, f.category
+    ),
+    dominant as (
+        select distinct on (c.merchant) c.merchant, c.category
+        from category_totals as c
+        order by c.merchant, c.total_price desc, c.category
+    )
+    select t.merchant, avg(t.total_price) as average_receipt, d.category
+    from receipt_totals as t
+    join dominant as d on d.merchant = t.merchant
+    group by t.merchant, d.category
+    order by average_receipt desc;
+$$;
+
+-- One row per receipt with the total of its matching items, for the KPIs and
+-- the receipt picker of the detail view.
+create or replace function public.kpi_by_receipt(
+    p_start date,
+    p_end date,
+    p_categories text[],
+    p_merchants text[]
+)
+returns table (
+    receipt_id uuid,
+    receipt_date date,
+    merchant text,
+    total_price numeric
+)
+language sql
+stable
+as $$
+    select f.receipt_id, f.receipt_date, f.merchant, sum(f.total_price) as total_price
+    from public.dashboard_filtered_items(p_start, p_end, p_categories, p_merchants) as f
+    group by f.receipt_id, f.receipt_date, f.merchant
+    order by f.receipt_date desc, f.receipt_id;
+$$;
+
+-- Bounds and choices offered by the sidebar filters: the date range, categories
+-- and merchants of the receipts that have items.
+create or replace function public.dashboard_filter_options()
+returns table (
+    min_date date,
+    max_date date,
+    categories text[],
+    merchants text[]
+)
+language sql
+stable
+as $$
+    select
+        min(r.receipt_date),
+        max(r.receipt_date),
+        array_agg(distinct i.category::text) filter (where i.category is not null),
+        array_agg(distinct r.merchant::text) filter (where r.merchant is not null)
+    from public.items as i
+    join public.receipts as r on r.id = i.receipt_id;
+$$;